@@ -0,0 +1,149 @@
+"""Compare peak RSS and decode time of the old and new /predict decode paths.
+
+Synthetic full-field-mammogram-sized images (16-bit PNG, grayscale and RGB
+JPEG, pyramidal TIFF) are written to a temp directory, then each one is
+decoded in a fresh subprocess so that ru_maxrss reflects a single decode.
+
+    python benchmarks/decode_benchmark.py [--width 4096 --height 5120] [--json out.json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from image_decode import decode_image  # noqa: E402
+
+TARGET_SIZE = (224, 224)
+
+
+def peak_rss_mb():
+    # VmHWM is reset on exec, unlike ru_maxrss which a child inherits on Linux
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def decode_baseline(path):
+    """The pre-change /predict path: full decode, RGB expansion, then resize"""
+    image = Image.open(path)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image.resize(TARGET_SIZE)
+
+
+def decode_downscaled(path):
+    with open(path, 'rb') as f:
+        return decode_image(f, TARGET_SIZE, max_pixels=10 ** 9)
+
+
+def make_images(directory, width, height):
+    """Write the synthetic test images and return {name: path}"""
+    rng = np.random.default_rng(0)
+    # Smooth-ish gradient plus noise so JPEG/PNG sizes are realistic
+    gradient = np.linspace(0, 1, width, dtype=np.float32)[None, :] * np.linspace(0.3, 1, height, dtype=np.float32)[:, None]
+    noise = rng.random((height, width), dtype=np.float32) * 0.1
+    base = np.clip(gradient + noise, 0, 1)
+
+    images = {}
+
+    path = os.path.join(directory, 'mammo_16bit.png')
+    Image.fromarray((base * 4095).astype(np.uint16)).save(path)
+    images['png_16bit_gray'] = path
+
+    gray = Image.fromarray((base * 255).astype(np.uint8))
+    path = os.path.join(directory, 'mammo_gray.jpg')
+    gray.save(path, quality=90)
+    images['jpeg_8bit_gray'] = path
+
+    path = os.path.join(directory, 'mammo_rgb.jpg')
+    gray.convert('RGB').save(path, quality=90)
+    images['jpeg_8bit_rgb'] = path
+
+    path = os.path.join(directory, 'mammo_pyramid.tif')
+    pages = [gray.resize((width // 2 ** i, height // 2 ** i)) for i in range(1, 5)]
+    gray.save(path, save_all=True, append_images=pages)
+    images['tiff_pyramid_gray'] = path
+
+    return images
+
+
+def run_worker(mode, path):
+    """Decode one image in this process and print a JSON result"""
+    decode = decode_baseline if mode == 'baseline' else decode_downscaled
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    image = decode(path)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'decode_ms': elapsed * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_rss_delta_mb': peak_rss_mb() - rss_before,
+        'output_size': list(image.size),
+    }))
+
+
+def measure(mode, path, repeats):
+    results = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', mode, path],
+            check=True, capture_output=True, text=True
+        )
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        'decode_ms': float(np.median([r['decode_ms'] for r in results])),
+        'peak_rss_mb': float(max(r['peak_rss_mb'] for r in results)),
+        'peak_rss_delta_mb': float(max(r['peak_rss_delta_mb'] for r in results)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=4096)
+    parser.add_argument('--height', type=int, default=5120)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--json', help='Write results to this JSON file')
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    report = {'width': args.width, 'height': args.height, 'results': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        images = make_images(directory, args.width, args.height)
+        print(f"{'image':<20} {'path':<10} {'decode ms':>10} {'peak RSS MB':>12} {'RSS delta MB':>13}")
+        for name, path in images.items():
+            report['results'][name] = {'file_bytes': os.path.getsize(path)}
+            for mode in ('baseline', 'downscale'):
+                result = measure(mode, path, args.repeats)
+                report['results'][name][mode] = result
+                print(f"{name:<20} {mode:<10} {result['decode_ms']:>10.1f} "
+                      f"{result['peak_rss_mb']:>12.1f} {result['peak_rss_delta_mb']:>13.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved -> {args.json}")
+
+
+if __name__ == '__main__':
+    main()
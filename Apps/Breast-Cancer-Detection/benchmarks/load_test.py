@@ -0,0 +1,366 @@
+"""Load-test the detection API with a stub or the real model.
+
+Starts api_server.py in a child process (with benchmarks/stub_model.py in
+place of DenseNet201, or the real model), drives it with a concurrent
+local load generator and records, per scenario, throughput, p50/p95/p99
+latency, error rate and the server's memory. Results go to JSON so runs of
+different versions can be compared.
+
+Scenarios:
+    single        one client, images from Test_images/
+    concurrent    --concurrency clients, images from Test_images/
+    large_images  --concurrency clients, synthetic full-field mammograms
+    cache_hits    --concurrency clients, the same image every request (the API
+                  has no response cache yet, so this is the baseline for one)
+    tiled         --concurrency clients, synthetic full-field mammograms with mode=tiled
+                  (Test_images/ are 224x224, a single tile)
+
+Per-scenario memory is the server's RSS sampled during that scenario. The
+kernel's VmHWM high-water mark covers the whole server lifetime, so it is
+reported once for the run (server_hwm_mb), not per scenario.
+
+    python benchmarks/load_test.py --backend stub --stub-cost-ms 30 --concurrency 8
+    python benchmarks/load_test.py --backend real --requests 100
+    python benchmarks/load_test.py --compare benchmark_results/old.json
+
+The server runs without similar-case indexing, so benchmark traffic never
+writes into a real SIMILARITY_INDEX_DIR. Pass --similarity-dir (ideally an
+empty temp directory) to include indexing in the measurement.
+"""
+import argparse
+import glob
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from decode_benchmark import make_images  # noqa: E402
+from stub_model import StubModel, StubEmbeddingModel  # noqa: E402
+
+SCENARIOS = ('single', 'concurrent', 'large_images', 'cache_hits', 'tiled')
+SCENARIO_NOTES = {
+    'cache_hits': 'No response cache exists; same-image baseline to compare a cache against',
+}
+MEMORY_SAMPLE_SECONDS = 0.05
+STARTUP_TIMEOUT_SECONDS = 600
+
+
+def serve(args):
+    """Run the Flask app in this process with the requested backend"""
+    os.chdir(APP_DIR)
+    import api_server
+
+    if args.backend == 'stub':
+        model = StubModel(args.stub_cost_ms, args.stub_overhead_ms, args.stub_mode)
+        api_server.swap_model('stub', model, StubEmbeddingModel(model), api_server.open_similarity_index('stub'))
+    else:
+        api_server.load_model()
+    api_server.app.run(host='127.0.0.1', port=args.port, threaded=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, port, log_file):
+    command = [
+        sys.executable, os.path.abspath(__file__), '--serve',
+        '--backend', args.backend, '--port', str(port),
+        '--stub-cost-ms', str(args.stub_cost_ms),
+        '--stub-overhead-ms', str(args.stub_overhead_ms),
+        '--stub-mode', args.stub_mode,
+    ]
+    # Synthetic cases must not end up in a real similarity index
+    env = dict(os.environ)
+    env.pop('SIMILARITY_INDEX_DIR', None)
+    if args.similarity_dir:
+        env['SIMILARITY_INDEX_DIR'] = os.path.abspath(args.similarity_dir)
+    process = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT, env=env)
+
+    deadline = time.time() + STARTUP_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited during startup (code {process.returncode}), see {log_file.name}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                if json.load(response).get('model_loaded'):
+                    return process
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not become healthy in time")
+
+
+def encode_multipart(path, form):
+    """Pre-encode one upload so the client spends no time on it per request"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in form.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    with open(path, 'rb') as f:
+        data = f.read()
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; '
+        f'filename="{os.path.basename(path)}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode()
+        + data + b'\r\n'
+    )
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def send(url, body, content_type, timeout):
+    """POST one request, returns (latency seconds, HTTP status or None on connection error)"""
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except (urllib.error.URLError, ConnectionError, OSError):
+        status = None
+    return time.perf_counter() - start, status
+
+
+class MemorySampler:
+    """Samples the server's resident memory on a background thread (Linux /proc)"""
+
+    def __init__(self, pid):
+        self.path = f'/proc/{pid}/status'
+        self.samples = []
+        self.running = False
+
+    def read(self, field='VmRSS'):
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    if line.startswith(field + ':'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+        return None
+
+    def _run(self):
+        while self.running:
+            rss = self.read()
+            if rss is not None:
+                self.samples.append(rss)
+            time.sleep(MEMORY_SAMPLE_SECONDS)
+
+    def __enter__(self):
+        self.samples = []
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+
+    def summary(self):
+        """RSS sampled while this sampler was running"""
+        if not self.samples:
+            return {'rss_mean_mb': None, 'rss_peak_mb': None}
+        return {
+            'rss_mean_mb': float(np.mean(self.samples)),
+            'rss_peak_mb': float(np.max(self.samples))
+        }
+
+
+def run_scenario(url, uploads, concurrency, n_requests, warmup, timeout, pid):
+    """Send n_requests spread over uploads with the given concurrency"""
+    for i in range(warmup):
+        send(url, *uploads[i % len(uploads)], timeout)
+
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    counter = iter(range(n_requests))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            latency, status = send(url, *uploads[i % len(uploads)], timeout)
+            with lock:
+                latencies.append(latency)
+                statuses.append(status)
+
+    with MemorySampler(pid) as sampler:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(worker)
+        elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    errors = sum(1 for status in statuses if status != 200)
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+
+    result = {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'duration_s': elapsed,
+        'throughput_rps': len(latencies) / elapsed,
+        'latency_ms': {
+            'p50': float(np.percentile(latencies_ms, 50)),
+            'p95': float(np.percentile(latencies_ms, 95)),
+            'p99': float(np.percentile(latencies_ms, 99)),
+            'mean': float(latencies_ms.mean()),
+            'max': float(latencies_ms.max())
+        },
+        'error_rate': errors / len(latencies),
+        'status_counts': status_counts
+    }
+    result['memory'] = sampler.summary()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(previous, current):
+    """Show throughput and latency changes against an earlier results file"""
+    print(f"\nCompared with {previous.get('git_commit')} ({previous.get('timestamp')}):")
+    print(f"{'scenario':<14} {'rps':>18} {'p50 ms':>20} {'p95 ms':>20}")
+    for name, result in current['scenarios'].items():
+        old = previous.get('scenarios', {}).get(name)
+        if old is None:
+            continue
+        cells = []
+        for new_value, old_value in (
+            (result['throughput_rps'], old['throughput_rps']),
+            (result['latency_ms']['p50'], old['latency_ms']['p50']),
+            (result['latency_ms']['p95'], old['latency_ms']['p95'])
+        ):
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            cells.append(f"{old_value:.1f}->{new_value:.1f} ({change:+.0f}%)")
+        print(f"{name:<14} {cells[0]:>18} {cells[1]:>20} {cells[2]:>20}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backend', choices=('stub', 'real'), default='stub')
+    parser.add_argument('--stub-cost-ms', type=float, default=20.0, help='Stub model cost per image')
+    parser.add_argument('--stub-overhead-ms', type=float, default=5.0, help='Stub model cost per predict call')
+    parser.add_argument('--stub-mode', choices=('sleep', 'cpu'), default='sleep')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--large-width', type=int, default=4096)
+    parser.add_argument('--large-height', type=int, default=5120)
+    parser.add_argument('--output', help='Results JSON (default benchmark_results/load_<backend>_<time>.json)')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    parser.add_argument('--similarity-dir',
+                        help='Enable similar-case indexing into this directory (default: disabled)')
+    parser.add_argument('--server-log', help='Write server output here instead of a temp file')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    test_images = sorted(glob.glob(os.path.join(APP_DIR, 'Test_images', '*')))
+    if not test_images:
+        raise SystemExit("No images found in Test_images/")
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'backend': args.backend,
+        'config': {key: value for key, value in vars(args).items() if key not in ('serve', 'port')},
+        'scenarios': {}
+    }
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/predict"
+    log_file = open(args.server_log, 'w') if args.server_log else tempfile.NamedTemporaryFile(
+        'w', prefix='load_test_server_', suffix='.log', delete=False)
+    process = start_server(args, port, log_file)
+    print(f"Server ({args.backend}) up on port {port}, log: {log_file.name}")
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            uploads = {
+                'test': [encode_multipart(path, {}) for path in test_images],
+                'repeat': [encode_multipart(test_images[0], {})],
+            }
+            if 'large_images' in args.scenarios or 'tiled' in args.scenarios:
+                large = make_images(directory, args.large_width, args.large_height)
+                uploads['large'] = [encode_multipart(path, {}) for path in large.values()]
+                uploads['tiled'] = [encode_multipart(path, {'mode': 'tiled'}) for path in large.values()]
+
+            plan = {
+                'single': ('test', 1),
+                'concurrent': ('test', args.concurrency),
+                'large_images': ('large', args.concurrency),
+                'cache_hits': ('repeat', args.concurrency),
+                'tiled': ('tiled', args.concurrency),
+            }
+            print(f"{'scenario':<14} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'peak RSS MB':>12}")
+            for name in args.scenarios:
+                upload_key, concurrency = plan[name]
+                result = run_scenario(url, uploads[upload_key], concurrency, args.requests,
+                                      args.warmup, args.timeout, process.pid)
+                if name in SCENARIO_NOTES:
+                    result['note'] = SCENARIO_NOTES[name]
+                report['scenarios'][name] = result
+                peak = result['memory']['rss_peak_mb']
+                print(f"{name:<14} {result['throughput_rps']:>8.1f} {result['latency_ms']['p50']:>9.1f} "
+                      f"{result['latency_ms']['p95']:>9.1f} {result['latency_ms']['p99']:>9.1f} "
+                      f"{result['error_rate']:>7.1%} {peak if peak is not None else float('nan'):>12.1f}")
+        # Lifetime peak of the server process, across all scenarios
+        report['server_hwm_mb'] = MemorySampler(process.pid).read('VmHWM')
+        print(f"Server lifetime peak memory (VmHWM): {report['server_hwm_mb']} MB")
+    finally:
+        process.terminate()
+        process.wait()
+        log_file.close()
+
+    output = args.output or os.path.join(
+        APP_DIR, 'benchmark_results', f"load_{args.backend}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved -> {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
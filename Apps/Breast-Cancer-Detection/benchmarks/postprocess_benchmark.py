@@ -0,0 +1,251 @@
+"""Benchmark response post-processing and JSON serialization for /predict.
+
+Compares, per probability vector:
+
+- legacy:     the pre-change per-request dict loops (kept below as a reference)
+- vectorized: postprocess.build_responses over a whole batch
+- compact:    build_responses with only predictions + top_prediction
+
+and serializes the results with the stdlib json (as jsonify did: sorted keys)
+versus orjson when installed. The vectorized output is checked against the
+legacy output before timing.
+
+The end-to-end section times what /predict does per request: build one
+response and turn it into a Flask response with jsonify, using Flask's
+default provider (before) and the API's FastJSONProvider (after).
+
+    python benchmarks/postprocess_benchmark.py [--batch 256] [--repeats 20] [--json out.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from flask import Flask, jsonify  # noqa: E402
+
+from json_provider import FastJSONProvider  # noqa: E402
+from postprocess import build_responses, COMPACT_FIELDS, FULL_FIELDS  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def legacy_response(pred):
+    """Response construction as it was before the vectorized post-processing"""
+    class_names = [
+        'Benign with Density=1', 'Malignant with Density=1',
+        'Benign with Density=2', 'Malignant with Density=2',
+        'Benign with Density=3', 'Malignant with Density=3',
+        'Benign with Density=4', 'Malignant with Density=4'
+    ]
+    predictions = {class_names[i]: float(pred[i]) for i in range(8)}
+    top_class, top_confidence = max(predictions.items(), key=lambda x: x[1])
+    benign_confidence = sum([predictions[name] for name in class_names if 'Benign' in name]) * 100
+    malignant_confidence = sum([predictions[name] for name in class_names if 'Malignant' in name]) * 100
+    density_analysis = {}
+    for density in range(1, 5):
+        benign_key = f'Benign with Density={density}'
+        malignant_key = f'Malignant with Density={density}'
+        density_analysis[f'Density {density}'] = {
+            'benign': predictions[benign_key] * 100,
+            'malignant': predictions[malignant_key] * 100,
+            'total': (predictions[benign_key] + predictions[malignant_key]) * 100
+        }
+    risk_level = "Low"
+    if malignant_confidence > 70:
+        risk_level = "High"
+    elif malignant_confidence > 40:
+        risk_level = "Moderate"
+
+    density_level = int(top_class.split('Density=')[1].split(')')[0])
+    interpretation = {
+        'primary_finding': f"The AI analysis indicates {top_class.lower()} with {top_confidence*100:.1f}% confidence.",
+        'malignancy_assessment': f"Overall malignant characteristics detected with {malignant_confidence:.1f}% confidence.",
+        'risk_evaluation': f"Risk level assessed as {risk_level.lower()} based on the analysis.",
+        'density_characteristics': f"Breast tissue density level {density_level} detected, which affects mammographic sensitivity.",
+        'clinical_significance': "",
+        'limitations': "This AI analysis is for research purposes only and should not replace professional medical diagnosis."
+    }
+    if 'Malignant' in top_class:
+        interpretation['clinical_significance'] = "Malignant characteristics detected require immediate medical attention and further diagnostic evaluation."
+    else:
+        interpretation['clinical_significance'] = "Benign characteristics detected, but regular monitoring and follow-up are still recommended."
+
+    recommendations = {'immediate_actions': [], 'follow_up': [], 'monitoring': [], 'additional_tests': []}
+    if risk_level == "High":
+        recommendations['immediate_actions'] = [
+            "Schedule immediate consultation with an oncologist",
+            "Consider biopsy for definitive diagnosis",
+            "Discuss treatment options with healthcare provider"
+        ]
+        recommendations['additional_tests'] = ["Core needle biopsy", "MRI breast imaging", "Ultrasound-guided biopsy"]
+    elif risk_level == "Moderate":
+        recommendations['immediate_actions'] = [
+            "Schedule follow-up appointment within 2-4 weeks",
+            "Discuss findings with primary care physician"
+        ]
+        recommendations['additional_tests'] = ["Follow-up mammography in 6 months", "Consider ultrasound examination"]
+    else:
+        recommendations['immediate_actions'] = [
+            "Continue regular breast cancer screening",
+            "Maintain healthy lifestyle habits"
+        ]
+    recommendations['follow_up'] = [
+        "Regular mammographic screening as per age guidelines",
+        "Monthly breast self-examination",
+        "Annual clinical breast examination"
+    ]
+    recommendations['monitoring'] = [
+        "Track any changes in breast tissue",
+        "Report new symptoms to healthcare provider",
+        "Maintain screening schedule"
+    ]
+
+    return {
+        'predictions': predictions,
+        'analysis': {
+            'top_prediction': {
+                'class': top_class,
+                'confidence': float(top_confidence * 100),
+                'is_malignant': 'Malignant' in top_class,
+                'density_level': density_level
+            },
+            'overall_assessment': {
+                'benign_confidence': float(benign_confidence),
+                'malignant_confidence': float(malignant_confidence),
+                'risk_level': risk_level,
+                'confidence_level': 'High' if top_confidence > 0.8 else 'Moderate' if top_confidence > 0.6 else 'Low'
+            },
+            'density_analysis': density_analysis,
+            'statistical_summary': {
+                'max_confidence': float(max(predictions.values()) * 100),
+                'min_confidence': float(min(predictions.values()) * 100),
+                'confidence_range': float((max(predictions.values()) - min(predictions.values())) * 100),
+                'prediction_entropy': float(-sum([p * np.log(p + 1e-10) for p in predictions.values()]))
+            }
+        },
+        'interpretation': interpretation,
+        'recommendations': recommendations,
+        'metadata': {
+            'model_version': 'DenseNet201_v1.0',
+            'analysis_timestamp': str(np.datetime64('now')),
+            'image_processed': True,
+            'preprocessing_applied': ['sharpening', 'normalization', 'resizing']
+        }
+    }
+
+
+def assert_equivalent(expected, actual, path=''):
+    """Same structure and values (floats to 1e-9, timestamps ignored)"""
+    if isinstance(expected, dict):
+        assert set(expected) == set(actual), f"{path}: keys differ"
+        for key in expected:
+            if key != 'analysis_timestamp':
+                assert_equivalent(expected[key], actual[key], f"{path}.{key}")
+    elif isinstance(expected, float):
+        assert abs(expected - actual) < 1e-9, f"{path}: {expected} != {actual}"
+    else:
+        assert expected == actual, f"{path}: {expected!r} != {actual!r}"
+
+
+def time_per_item(func, n_items, repeats):
+    """Best-of-repeats time per item in microseconds"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best / n_items * 1e6
+
+
+def flask_app(provider=None):
+    """A bare Flask app, optionally with a custom JSON provider"""
+    app = Flask(__name__)
+    if provider is not None:
+        app.json = provider(app)
+    return app
+
+
+def time_jsonify(app, make_response, preds, repeats):
+    """Per-request time of building a response and passing it through jsonify"""
+    with app.app_context():
+        return time_per_item(lambda: [jsonify(make_response(pred)).get_data() for pred in preds],
+                             len(preds), repeats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch', type=int, default=256)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Dirichlet samples look like softmax outputs with varied confidence
+    preds = rng.dirichlet(np.full(8, 0.5), size=args.batch).astype(np.float32)
+
+    legacy = [legacy_response(pred) for pred in preds]
+    vectorized = build_responses(preds)
+    for expected, actual in zip(legacy, vectorized):
+        assert_equivalent(expected, actual)
+    compact = build_responses(preds, COMPACT_FIELDS)
+
+    results = {
+        'batch': args.batch,
+        'build_us_per_response': {
+            'legacy': time_per_item(lambda: [legacy_response(pred) for pred in preds], args.batch, args.repeats),
+            'vectorized_single': time_per_item(lambda: [build_responses(pred, FULL_FIELDS) for pred in preds],
+                                               args.batch, args.repeats),
+            'vectorized_batch': time_per_item(lambda: build_responses(preds), args.batch, args.repeats),
+            'compact_batch': time_per_item(lambda: build_responses(preds, COMPACT_FIELDS), args.batch, args.repeats),
+        },
+        'serialize_us_per_response': {
+            'json_sorted_full': time_per_item(lambda: [json.dumps(r, sort_keys=True) for r in legacy],
+                                              args.batch, args.repeats),
+            'json_compact_full': time_per_item(lambda: [json.dumps(r, separators=(',', ':')) for r in vectorized],
+                                               args.batch, args.repeats),
+        },
+        'response_bytes': {
+            'full': len(json.dumps(vectorized[0], separators=(',', ':'))),
+            'compact': len(json.dumps(compact[0], separators=(',', ':'))),
+        }
+    }
+    if orjson is not None:
+        results['serialize_us_per_response']['orjson_full'] = time_per_item(
+            lambda: [orjson.dumps(r) for r in vectorized], args.batch, args.repeats)
+        results['serialize_us_per_response']['orjson_compact'] = time_per_item(
+            lambda: [orjson.dumps(r) for r in compact], args.batch, args.repeats)
+
+    default_app, fast_app = flask_app(), flask_app(FastJSONProvider)
+    with fast_app.app_context():
+        body = jsonify(vectorized[0]).get_data()
+    assert json.loads(body) == vectorized[0]
+    results['jsonify_us_per_request'] = {
+        'legacy_default_provider': time_jsonify(default_app, legacy_response, preds, args.repeats),
+        'full_fast_provider': time_jsonify(fast_app, lambda pred: build_responses(pred)[0], preds, args.repeats),
+        'compact_fast_provider': time_jsonify(fast_app, lambda pred: build_responses(pred, COMPACT_FIELDS)[0],
+                                              preds, args.repeats),
+    }
+
+    print("Vectorized responses match the legacy implementation")
+    for section in ('build_us_per_response', 'serialize_us_per_response', 'jsonify_us_per_request', 'response_bytes'):
+        print(f"\n{section}")
+        for name, value in results[section].items():
+            print(f"  {name:<24} {value:10.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved -> {args.json}")
+
+
+if __name__ == '__main__':
+    main()
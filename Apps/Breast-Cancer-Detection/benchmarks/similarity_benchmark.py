@@ -0,0 +1,105 @@
+"""Measure /similar search latency and recall of the on-disk similarity index.
+
+Fills a temporary index with synthetic clustered embeddings (DenseNet201
+pooled features are 1920-dimensional), builds the IVF index and compares
+exact and approximate search.
+
+    python benchmarks/similarity_benchmark.py [--count 1000000] [--dim 1920] [--json out.json]
+
+A million 1920-d float16 vectors take ~3.8 GB of disk in the temp directory.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from similarity_index import SimilarityIndex  # noqa: E402
+
+ADD_BATCH = 50000
+
+
+def clustered_vectors(rng, centers, count, noise=0.5):
+    """Synthetic embeddings scattered around a fixed set of cluster centres"""
+    labels = rng.integers(0, len(centers), count)
+    return centers[labels] + noise * rng.standard_normal((count, centers.shape[1]), dtype=np.float32)
+
+
+def latency_summary(latencies):
+    latencies = np.array(latencies)
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(latencies.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=1920)
+    parser.add_argument('--clusters', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((args.clusters, args.dim), dtype=np.float32)
+    report = {'count': args.count, 'dim': args.dim, 'k': args.k}
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = SimilarityIndex(directory)
+
+        start = time.perf_counter()
+        for offset in range(0, args.count, ADD_BATCH):
+            batch = min(ADD_BATCH, args.count - offset)
+            index.add(clustered_vectors(rng, centers, batch), [{'n': offset + i} for i in range(batch)])
+        report['add_seconds'] = time.perf_counter() - start
+        print(f"Added {len(index)} vectors in {report['add_seconds']:.1f}s")
+
+        start = time.perf_counter()
+        index.build_ivf()
+        report['ivf_build_seconds'] = time.perf_counter() - start
+        print(f"Built IVF in {report['ivf_build_seconds']:.1f}s")
+
+        queries = clustered_vectors(rng, centers, args.queries)
+
+        exact_ids, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            matches = index.search(query, args.k, exact=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+            exact_ids.append({case['case_id'] for case, _ in matches})
+        report['exact'] = latency_summary(latencies)
+        print(f"exact        p50 {report['exact']['p50_ms']:8.2f} ms  p99 {report['exact']['p99_ms']:8.2f} ms")
+
+        for nprobe in args.nprobe:
+            latencies, hits = [], 0
+            for query, expected in zip(queries, exact_ids):
+                start = time.perf_counter()
+                matches = index.search(query, args.k, nprobe=nprobe)
+                latencies.append((time.perf_counter() - start) * 1000)
+                hits += len(expected & {case['case_id'] for case, _ in matches})
+            result = latency_summary(latencies)
+            result['recall'] = hits / (args.k * len(queries))
+            report[f'ivf_nprobe_{nprobe}'] = result
+            print(f"ivf nprobe={nprobe:<3} p50 {result['p50_ms']:8.2f} ms  p99 {result['p99_ms']:8.2f} ms  "
+                  f"recall@{args.k} {result['recall']:.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved -> {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Stand-in for the DenseNet201 model, for benchmarking the API without weights.
+
+StubModel has the same predict() interface and shapes as the Keras model
+((N, 224, 224, 3) float32 in, (N, 8) softmax out) and a configurable compute
+cost, so the HTTP, decode and post-processing layers can be measured on any
+machine. Outputs are deterministic functions of the input, so different
+images get different (but meaningless) predictions.
+"""
+import time
+
+import numpy as np
+
+EMBEDDING_SIZE = 1920  # DenseNet201 pooled features
+
+
+class StubModel:
+    """Model with the real input/output shapes and a tunable cost per call and per image
+
+    mode='sleep' waits (releases the GIL, like TensorFlow does during inference);
+    mode='cpu' burns the same time with numpy matrix multiplies.
+    """
+
+    def __init__(self, cost_ms=20.0, overhead_ms=5.0, mode='sleep', seed=0):
+        self.cost_ms = cost_ms
+        self.overhead_ms = overhead_ms
+        self.mode = mode
+        rng = np.random.default_rng(seed)
+        # Channel mean/std -> logits, scaled so predictions are not uniform
+        self.weights = rng.standard_normal((6, 8)).astype(np.float32) * 8
+        self.projection = rng.standard_normal((6 * 16, EMBEDDING_SIZE)).astype(np.float32)
+        self.input_shape = (None, 224, 224, 3)
+        self.output_shape = (None, 8)
+
+    def _spend(self, batch_size):
+        duration = (self.overhead_ms + self.cost_ms * batch_size) / 1000
+        if self.mode == 'sleep':
+            time.sleep(duration)
+            return
+        deadline = time.perf_counter() + duration
+        block = np.ones((256, 256), dtype=np.float32)
+        while time.perf_counter() < deadline:
+            block = np.tanh(block @ block * 1e-3)
+
+    def _features(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        return np.concatenate([x.mean(axis=(1, 2)), x.std(axis=(1, 2))], axis=1)
+
+    def _softmax(self, features):
+        logits = (features - 0.3) @ self.weights
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        self._spend(len(x))
+        return self._softmax(self._features(x))
+
+    def embed(self, x):
+        """Pooled-feature-shaped embedding from a 4x4 grid of channel statistics"""
+        x = np.asarray(x, dtype=np.float32)
+        n = len(x)
+        grid = x.reshape(n, 4, 56, 4, 56, 3)
+        stats = np.concatenate([grid.mean(axis=(2, 4)), grid.std(axis=(2, 4))], axis=-1)
+        return np.maximum(stats.reshape(n, -1) @ self.projection, 0)
+
+
+class StubEmbeddingModel:
+    """Counterpart of build_embedding_model(): returns (features, probabilities) in one call"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, x, batch_size=None, verbose=0):
+        self.model._spend(len(x))
+        return self.model.embed(x), self.model._softmax(self.model._features(x))
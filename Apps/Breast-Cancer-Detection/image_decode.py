@@ -0,0 +1,119 @@
+"""Memory-bounded image decoding for the detection API.
+
+Uploads are decoded straight to (roughly) the model input size instead of at
+full resolution:
+
+- JPEGs use DCT-domain scaling (Pillow draft mode), so a 4000x5000 mammogram
+  is only ever decoded at 1/8 scale.
+- Multi-page / pyramidal TIFFs use the smallest page that still covers the
+  target size.
+- 16-bit grayscale data is shrunk first and then windowed down to 8 bits,
+  instead of being clipped by ``convert('RGB')``.
+- 8-bit grayscale stays single-channel until it is already small, so the
+  3x colour expansion happens at 224x224 instead of at full resolution.
+"""
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Upload limits (override through the environment)
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 64 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 80_000_000))
+
+# Keep Pillow's own decompression-bomb guard in line with our limit
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+SIXTEEN_BIT_MODES = ('I;16', 'I;16L', 'I;16B', 'I;16N', 'I', 'F')
+
+# Percentiles used to window high bit-depth images into 8 bits
+WINDOW_PERCENTILES = (0.5, 99.5)
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured byte or pixel limits"""
+
+
+def check_pixel_limit(image, max_pixels=None):
+    """Reject images whose header reports more pixels than allowed"""
+    if max_pixels is None:
+        max_pixels = MAX_IMAGE_PIXELS
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height} ({width * height} pixels), "
+            f"limit is {max_pixels} pixels"
+        )
+
+
+def select_frame(image, target_size):
+    """Seek to the smallest page of a multi-page image that still covers target_size"""
+    n_frames = getattr(image, 'n_frames', 1)
+    if n_frames <= 1:
+        return image
+
+    best_index, best_area = 0, None
+    for index in range(n_frames):
+        image.seek(index)
+        width, height = image.size
+        if width >= target_size[0] and height >= target_size[1]:
+            if best_area is None or width * height < best_area:
+                best_index, best_area = index, width * height
+    image.seek(best_index)
+    return image
+
+
+def window_to_uint8(array):
+    """Map a high bit-depth array to 0-255 using a percentile window"""
+    array = array.astype(np.float32)
+    low, high = np.percentile(array, WINDOW_PERCENTILES)
+    if high <= low:
+        high = low + 1.0
+    array = (array - low) * (255.0 / (high - low))
+    return np.clip(array, 0, 255).astype(np.uint8)
+
+
+def fit_within(size, box):
+    """Largest size with the aspect ratio of size that fits in box (never upscales)"""
+    width, height = size
+    scale = min(box[0] / width, box[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def decode_image(stream, target_size=(224, 224), max_pixels=None, keep_aspect=False):
+    """Decode an uploaded image directly to an RGB PIL image of target_size
+
+    With keep_aspect=True, target_size is a bounding box and the aspect ratio
+    of the upload is preserved.
+    """
+    image = Image.open(stream)
+    if keep_aspect:
+        target_size = fit_within(image.size, target_size)
+    image = select_frame(image, target_size)
+    check_pixel_limit(image, max_pixels)
+    if keep_aspect:
+        # A pyramid page may have a slightly different aspect ratio
+        target_size = fit_within(image.size, target_size)
+
+    # JPEG: let libjpeg scale by 1/2, 1/4 or 1/8 while decoding
+    if image.format == 'JPEG':
+        image.draft(image.mode, target_size)
+
+    if image.mode in SIXTEEN_BIT_MODES:
+        # Area-average in the native bit depth, then window to 8 bits
+        array = np.asarray(image)
+        if array.dtype not in (np.uint16, np.float32):
+            # cv2 rejects int32 and non-native byte orders
+            array = array.astype(np.float32)
+        array = cv2.resize(array, target_size, interpolation=cv2.INTER_AREA)
+        image = Image.fromarray(window_to_uint8(array))
+    elif image.mode in ('L', 'RGB'):
+        image = image.resize(target_size, Image.BICUBIC, reducing_gap=3.0)
+    else:
+        image = image.convert('RGB')
+        image = image.resize(target_size, Image.BICUBIC, reducing_gap=3.0)
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
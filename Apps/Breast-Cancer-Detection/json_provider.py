@@ -0,0 +1,28 @@
+"""Flask JSON provider that serializes responses with orjson when it is installed."""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Serialize responses with orjson when installed, otherwise compact unsorted json"""
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        # Formatting options only matter to the stdlib encoder; orjson output is always compact
+        if orjson is not None and set(kwargs) <= {'separators', 'indent', 'sort_keys'}:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """jsonify(): build the response body straight from orjson's bytes"""
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,173 @@
+"""Versioned model registry and shadow scoring for the detection API.
+
+Registry layout (MODEL_REGISTRY_DIR, default ``models/``):
+
+    models/
+        ACTIVE              name of the version served on startup
+        2025-06-01/
+            model.h5        full Keras model (optional)
+            weights.h5      weights to load on top (optional)
+        2025-07-15/
+            ...
+
+A version without model.h5 is built with create_new_model(), exactly like the
+legacy ``model/model.h5`` + ``weights/modeldense1.h5`` layout, which is still
+used when the registry has no ACTIVE version.
+"""
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', 'models')
+
+LEGACY_VERSION = 'legacy'
+LEGACY_MODEL_PATH = 'model/model.h5'
+LEGACY_WEIGHTS_PATH = 'weights/modeldense1.h5'
+
+# Shadow scoring: inputs are queued and scored in batches on a worker thread
+SHADOW_BATCH_SIZE = 16
+SHADOW_QUEUE_SIZE = 256
+SHADOW_LOG_EVERY = 100
+
+# Same index layout as class_names in api_server
+MALIGNANT_INDICES = [1, 3, 5, 7]
+
+
+def list_versions():
+    """Names of the version directories in the registry"""
+    if not os.path.isdir(MODEL_REGISTRY_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(MODEL_REGISTRY_DIR)
+        if os.path.isdir(os.path.join(MODEL_REGISTRY_DIR, name))
+    )
+
+
+def version_paths(version):
+    """Return (model_path, weights_path) for a version, legacy paths for LEGACY_VERSION"""
+    if version == LEGACY_VERSION:
+        return LEGACY_MODEL_PATH, LEGACY_WEIGHTS_PATH
+    if version not in list_versions():
+        raise ValueError(f"Unknown model version '{version}'")
+    directory = os.path.join(MODEL_REGISTRY_DIR, version)
+    return os.path.join(directory, 'model.h5'), os.path.join(directory, 'weights.h5')
+
+
+def read_active_version():
+    """Version recorded in the registry's ACTIVE file, or LEGACY_VERSION"""
+    path = os.path.join(MODEL_REGISTRY_DIR, 'ACTIVE')
+    if os.path.exists(path):
+        with open(path) as f:
+            version = f.read().strip()
+        if version in list_versions():
+            return version
+        print(f"Warning: ACTIVE model version '{version}' not found in registry")
+    return LEGACY_VERSION
+
+
+def write_active_version(version):
+    """Record the served version so a restart serves it too"""
+    if not os.path.isdir(MODEL_REGISTRY_DIR):
+        return
+    path = os.path.join(MODEL_REGISTRY_DIR, 'ACTIVE')
+    if version == LEGACY_VERSION:
+        # No ACTIVE file means the legacy model on startup
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, path)
+
+
+class ShadowScorer:
+    """Scores a sample of live inputs with a candidate model off the request path
+
+    submit() only enqueues (and drops inputs when the queue is full), so the
+    primary response never waits on the candidate. The worker thread drains
+    whatever is queued into one batch per forward pass.
+    """
+
+    def __init__(self, version, model, fraction):
+        self.version = version
+        self.model = model
+        self.fraction = fraction
+        self.queue = queue.Queue(maxsize=SHADOW_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.running = True
+        self.scored = 0
+        self.dropped = 0
+        self.top_class_agreements = 0
+        self.malignancy_agreements = 0
+        self.abs_diff_sum = 0.0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, img_batch, primary_preds):
+        """Queue a sampled (input, primary prediction) pair for shadow scoring"""
+        if not self.running or random.random() >= self.fraction:
+            return
+        try:
+            self.queue.put_nowait((img_batch, primary_preds))
+        except queue.Full:
+            with self.lock:
+                self.dropped += len(img_batch)
+
+    def stop(self):
+        self.running = False
+        try:
+            # Wake the worker up if it is waiting on an empty queue
+            self.queue.put_nowait((None, None))
+        except queue.Full:
+            pass
+
+    def _run(self):
+        while self.running:
+            items = [self.queue.get()]
+            while len(items) < SHADOW_BATCH_SIZE:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            items = [item for item in items if item[0] is not None]
+            if not items:
+                continue
+            try:
+                inputs = np.concatenate([item[0] for item in items])
+                primary = np.concatenate([item[1] for item in items])
+                shadow = self.model.predict(inputs, batch_size=len(inputs), verbose=0)
+                self._record(primary, shadow)
+            except Exception as e:
+                print(f"Shadow scoring error ({self.version}): {e}")
+
+    def _record(self, primary, shadow):
+        primary_malignant = primary[:, MALIGNANT_INDICES].sum(axis=1) > 0.5
+        shadow_malignant = shadow[:, MALIGNANT_INDICES].sum(axis=1) > 0.5
+        with self.lock:
+            previous = self.scored
+            self.scored += len(primary)
+            self.top_class_agreements += int(np.sum(primary.argmax(axis=1) == shadow.argmax(axis=1)))
+            self.malignancy_agreements += int(np.sum(primary_malignant == shadow_malignant))
+            self.abs_diff_sum += float(np.abs(primary - shadow).mean(axis=1).sum())
+            should_log = self.scored // SHADOW_LOG_EVERY > previous // SHADOW_LOG_EVERY
+        if should_log:
+            print(f"Shadow agreement: {self.stats()}")
+
+    def stats(self):
+        with self.lock:
+            scored = self.scored
+            return {
+                'version': self.version,
+                'fraction': self.fraction,
+                'scored': scored,
+                'dropped': self.dropped,
+                'top_class_agreement': self.top_class_agreements / scored if scored else None,
+                'malignancy_agreement': self.malignancy_agreements / scored if scored else None,
+                'mean_abs_prob_diff': self.abs_diff_sum / scored if scored else None,
+            }
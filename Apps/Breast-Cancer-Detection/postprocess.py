@@ -0,0 +1,298 @@
+"""Vectorised post-processing of model outputs into /predict responses.
+
+The 8 model outputs are ordered (Benign, Malignant) x Density 1-4, so a batch
+of probability vectors reshapes to (N, 4, 2): axis 1 is the density level,
+axis 2 is benign/malignant. All sums, risk and confidence levels for a batch
+are computed with a handful of numpy operations, and everything that depends
+only on the risk level, density level or malignancy (recommendations and most
+interpretation sentences) is built once at import time and shared.
+
+The server scores one image per request, and for a single vector numpy's
+per-call overhead costs more than the arithmetic, so batches of one take an
+equivalent plain-Python path (summarize_single).
+
+The shared blocks are never mutated after import; callers must not modify
+them either.
+"""
+import math
+
+import numpy as np
+
+CLASS_NAMES = (
+    'Benign with Density=1',
+    'Malignant with Density=1',
+    'Benign with Density=2',
+    'Malignant with Density=2',
+    'Benign with Density=3',
+    'Malignant with Density=3',
+    'Benign with Density=4',
+    'Malignant with Density=4'
+)
+CLASS_NAMES_LOWER = tuple(name.lower() for name in CLASS_NAMES)
+DENSITY_KEYS = ('Density 1', 'Density 2', 'Density 3', 'Density 4')
+
+RISK_LEVELS = ('Low', 'Moderate', 'High')
+CONFIDENCE_LEVELS = ('Low', 'Moderate', 'High')
+
+# Strict lower bounds of Moderate and High (malignant % and top probability)
+RISK_THRESHOLDS = np.array([40.0, 70.0])
+CONFIDENCE_THRESHOLDS = np.array([0.6, 0.8])
+# Python floats for the single-vector path (numpy scalar comparisons are slow)
+RISK_MODERATE, RISK_HIGH = RISK_THRESHOLDS.tolist()
+CONFIDENCE_MODERATE, CONFIDENCE_HIGH = CONFIDENCE_THRESHOLDS.tolist()
+
+# Top-level response sections; 'top_prediction' is analysis.top_prediction
+# hoisted to the top level for compact responses
+FULL_FIELDS = ('predictions', 'analysis', 'interpretation', 'recommendations', 'metadata')
+COMPACT_FIELDS = ('predictions', 'top_prediction')
+RESPONSE_FIELDS = FULL_FIELDS + ('top_prediction', 'tiling')
+
+LIMITATIONS = "This AI analysis is for research purposes only and should not replace professional medical diagnosis."
+
+RISK_EVALUATIONS = {
+    level: f"Risk level assessed as {level.lower()} based on the analysis." for level in RISK_LEVELS
+}
+
+DENSITY_CHARACTERISTICS = {
+    density: f"Breast tissue density level {density} detected, which affects mammographic sensitivity."
+    for density in range(1, 5)
+}
+
+CLINICAL_SIGNIFICANCE = {
+    True: "Malignant characteristics detected require immediate medical attention and further diagnostic evaluation.",
+    False: "Benign characteristics detected, but regular monitoring and follow-up are still recommended."
+}
+
+FOLLOW_UP = (
+    "Regular mammographic screening as per age guidelines",
+    "Monthly breast self-examination",
+    "Annual clinical breast examination"
+)
+
+MONITORING = (
+    "Track any changes in breast tissue",
+    "Report new symptoms to healthcare provider",
+    "Maintain screening schedule"
+)
+
+RECOMMENDATIONS = {
+    'High': {
+        'immediate_actions': [
+            "Schedule immediate consultation with an oncologist",
+            "Consider biopsy for definitive diagnosis",
+            "Discuss treatment options with healthcare provider"
+        ],
+        'follow_up': list(FOLLOW_UP),
+        'monitoring': list(MONITORING),
+        'additional_tests': [
+            "Core needle biopsy",
+            "MRI breast imaging",
+            "Ultrasound-guided biopsy"
+        ]
+    },
+    'Moderate': {
+        'immediate_actions': [
+            "Schedule follow-up appointment within 2-4 weeks",
+            "Discuss findings with primary care physician"
+        ],
+        'follow_up': list(FOLLOW_UP),
+        'monitoring': list(MONITORING),
+        'additional_tests': [
+            "Follow-up mammography in 6 months",
+            "Consider ultrasound examination"
+        ]
+    },
+    'Low': {
+        'immediate_actions': [
+            "Continue regular breast cancer screening",
+            "Maintain healthy lifestyle habits"
+        ],
+        'follow_up': list(FOLLOW_UP),
+        'monitoring': list(MONITORING),
+        'additional_tests': []
+    }
+}
+
+
+def summarize_batch(preds):
+    """Compute every derived number of the response for a (N, 8) batch at once"""
+    preds = np.asarray(preds, dtype=np.float64).reshape(-1, 8)
+    pairs = preds.reshape(-1, 4, 2) * 100  # (N, density, benign/malignant)
+    totals = pairs.sum(axis=1)  # (N, benign/malignant)
+
+    top_index = preds.argmax(axis=1)
+    top_confidence = preds.max(axis=1)
+    min_confidence = preds.min(axis=1)
+
+    return {
+        'preds': preds,
+        'top_index': top_index,
+        'top_confidence': top_confidence,
+        'benign_confidence': totals[:, 0],
+        'malignant_confidence': totals[:, 1],
+        # 0 = Low, 1 = Moderate (> 40), 2 = High (> 70)
+        'risk_index': np.searchsorted(RISK_THRESHOLDS, totals[:, 1], side='left'),
+        # 0 = Low, 1 = Moderate (> 0.6), 2 = High (> 0.8)
+        'confidence_index': np.searchsorted(CONFIDENCE_THRESHOLDS, top_confidence, side='left'),
+        'density_pairs': pairs,
+        'max_confidence': top_confidence * 100,
+        'min_confidence': min_confidence * 100,
+        'confidence_range': (top_confidence - min_confidence) * 100,
+        'entropy': -np.einsum('ij,ij->i', preds, np.log(preds + 1e-10))
+    }
+
+
+def summarize_single(pred):
+    """summarize_batch for one vector, as lists of Python numbers (same values, no numpy overhead)"""
+    p = np.asarray(pred, dtype=np.float64).reshape(8).tolist()
+    top_index = max(range(8), key=p.__getitem__)
+    top_confidence = p[top_index]
+    min_confidence = min(p)
+    pairs = [[p[i] * 100, p[i + 1] * 100] for i in range(0, 8, 2)]
+    malignant = sum(m for _, m in pairs)
+    return {
+        'preds': [p],
+        'top_index': [top_index],
+        'top_confidence': [top_confidence],
+        'benign_confidence': [sum(b for b, _ in pairs)],
+        'malignant_confidence': [malignant],
+        'risk_index': [(malignant > RISK_MODERATE) + (malignant > RISK_HIGH)],
+        'confidence_index': [(top_confidence > CONFIDENCE_MODERATE) + (top_confidence > CONFIDENCE_HIGH)],
+        'density_pairs': [pairs],
+        'max_confidence': [top_confidence * 100],
+        'min_confidence': [min_confidence * 100],
+        'confidence_range': [(top_confidence - min_confidence) * 100],
+        'entropy': [-sum([x * math.log(x + 1e-10) for x in p])]
+    }
+
+
+def summary_lists(preds):
+    """Summary of a batch with every value converted to Python lists"""
+    preds = np.asarray(preds)
+    if preds.size == 8:
+        return summarize_single(preds)
+    # One bulk conversion to Python floats instead of per-element float() calls
+    return {key: value.tolist() for key, value in summarize_batch(preds).items()}
+
+
+def top_prediction_block(top_index, top_confidence):
+    return {
+        'class': CLASS_NAMES[top_index],
+        'confidence': float(top_confidence * 100),
+        'is_malignant': bool(top_index % 2),
+        'density_level': top_index // 2 + 1
+    }
+
+
+def interpretation_block(top_index, top_confidence, malignant_confidence, risk_level):
+    """Detailed medical interpretation; only two sentences depend on the numbers"""
+    return {
+        'primary_finding': f"The AI analysis indicates {CLASS_NAMES_LOWER[top_index]} with {top_confidence * 100:.1f}% confidence.",
+        'malignancy_assessment': f"Overall malignant characteristics detected with {malignant_confidence:.1f}% confidence.",
+        'risk_evaluation': RISK_EVALUATIONS[risk_level],
+        'density_characteristics': DENSITY_CHARACTERISTICS[top_index // 2 + 1],
+        'clinical_significance': CLINICAL_SIGNIFICANCE[bool(top_index % 2)],
+        'limitations': LIMITATIONS
+    }
+
+
+def build_responses(preds, fields=FULL_FIELDS, preprocessing_applied=None, model_version='DenseNet201_v1.0'):
+    """Build /predict responses for a batch of probability vectors, computing only the requested fields"""
+    summary = summary_lists(preds)
+    fields = set(fields)
+    timestamp = str(np.datetime64('now'))
+    preprocessing_applied = preprocessing_applied or ['sharpening', 'normalization', 'resizing']
+
+    probabilities = summary['preds']
+    density_pairs = summary['density_pairs']
+    top_indices = summary['top_index']
+    top_confidences = summary['top_confidence']
+    benign = summary['benign_confidence']
+    malignant = summary['malignant_confidence']
+    risk_indices = summary['risk_index']
+    confidence_indices = summary['confidence_index']
+    max_confidence = summary['max_confidence']
+    min_confidence = summary['min_confidence']
+    confidence_range = summary['confidence_range']
+    entropy = summary['entropy']
+
+    responses = []
+    for i, top_index in enumerate(top_indices):
+        risk_level = RISK_LEVELS[risk_indices[i]]
+        response = {}
+
+        if 'predictions' in fields:
+            response['predictions'] = dict(zip(CLASS_NAMES, probabilities[i]))
+
+        if 'top_prediction' in fields or 'analysis' in fields:
+            top_prediction = top_prediction_block(top_index, top_confidences[i])
+            if 'top_prediction' in fields:
+                response['top_prediction'] = top_prediction
+
+        if 'analysis' in fields:
+            response['analysis'] = {
+                'top_prediction': top_prediction,
+                'overall_assessment': {
+                    'benign_confidence': benign[i],
+                    'malignant_confidence': malignant[i],
+                    'risk_level': risk_level,
+                    'confidence_level': CONFIDENCE_LEVELS[confidence_indices[i]]
+                },
+                'density_analysis': {
+                    key: {'benign': b, 'malignant': m, 'total': b + m}
+                    for key, (b, m) in zip(DENSITY_KEYS, density_pairs[i])
+                },
+                'statistical_summary': {
+                    'max_confidence': max_confidence[i],
+                    'min_confidence': min_confidence[i],
+                    'confidence_range': confidence_range[i],
+                    'prediction_entropy': entropy[i]
+                }
+            }
+
+        if 'interpretation' in fields:
+            response['interpretation'] = interpretation_block(top_index, top_confidences[i], malignant[i], risk_level)
+
+        if 'recommendations' in fields:
+            # Shared, precomputed block
+            response['recommendations'] = RECOMMENDATIONS[risk_level]
+
+        if 'metadata' in fields:
+            response['metadata'] = {
+                'model_version': model_version,
+                'analysis_timestamp': timestamp,
+                'image_processed': True,
+                'preprocessing_applied': preprocessing_applied
+            }
+
+        responses.append(response)
+    return responses
+
+
+def parse_fields(fields_param, compact=False):
+    """Validate a comma-separated fields= value (or compact flag) into a tuple of sections
+
+    Returns None when the full response was asked for.
+    """
+    if compact:
+        return COMPACT_FIELDS
+    if not fields_param:
+        return None
+    fields = tuple(field.strip() for field in fields_param.split(',') if field.strip())
+    if not fields:
+        raise ValueError(f"No fields given, expected any of {list(RESPONSE_FIELDS)}")
+    unknown = [field for field in fields if field not in RESPONSE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}, expected any of {list(RESPONSE_FIELDS)}")
+    return fields
+
+
+def select_fields(response, fields):
+    """Keep only the requested top-level sections of an already built response"""
+    selected = {}
+    for field in fields:
+        if field == 'top_prediction' and 'analysis' in response:
+            selected[field] = response['analysis']['top_prediction']
+        elif field in response:
+            selected[field] = response[field]
+    return selected
@@ -0,0 +1,389 @@
+"""On-disk similar-case index for DenseNet201 embeddings.
+
+Layout of an index directory:
+
+    header.json         dimension, number of stored vectors, IVF state
+    vectors.f16         L2-normalised float16 vectors, memory-mapped (capacity x dim)
+    cases.jsonl         one metadata record per vector, in the same order
+    ivf_<gen>_*.npy     inverted-file index (centroids + vector ids grouped by list)
+    ivf_<gen>_tail.i32  list of every vector added since build <gen>
+
+Search is cosine similarity (dot product of normalised vectors). Exact search
+scans the memmap in chunks. Approximate search uses a locally trained IVF
+index: the query is compared to the list centroids, and only the vectors of
+the nprobe closest lists are scored. Vectors added after the last IVF build
+are assigned to their nearest centroid on add(), so new cases are searchable
+immediately without an exact scan; rebuilds only refresh the centroids.
+
+Every IVF build writes a new generation of files and the header is switched
+to it last, so searches holding the previous generation's memory maps keep
+reading consistent (unlinked) files.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+# 4096 x 1920 float32 rows is ~30 MB per chunk
+SCAN_CHUNK_ROWS = 4096
+
+# Below this many vectors exact search is fast enough and IVF is not built
+MIN_IVF_VECTORS = 20000
+
+# Retrain the IVF centroids once this fraction of vectors was added since the last build
+IVF_REBUILD_FRACTION = 0.1
+
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLES_PER_LIST = 32
+KMEANS_MAX_SAMPLES = 100000
+
+
+def normalize(vectors):
+    """L2-normalise rows (or a single vector)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, ids, k):
+    """Return the k highest (score, id) pairs, best first"""
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[keep], ids[keep]
+    order = np.argsort(-scores)
+    return scores[order], ids[order]
+
+
+def spherical_kmeans(samples, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Cluster normalised samples by cosine similarity, returns normalised centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = samples[rng.choice(len(samples), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(samples @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, samples)
+        counts = np.bincount(assignment, minlength=n_lists)
+        # Re-seed empty lists with random samples
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = samples[rng.choice(len(samples), int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+class SimilarityIndex:
+    """Append-only memory-mapped vector store with exact and IVF search"""
+
+    def __init__(self, directory, dim=None):
+        self.directory = directory
+        self.lock = threading.Lock()
+        # Held for a whole IVF build so two builds never write the same generation
+        self.build_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        header_path = os.path.join(directory, 'header.json')
+        if os.path.exists(header_path):
+            with open(header_path) as f:
+                header = json.load(f)
+        else:
+            header = {'dim': dim, 'count': 0, 'capacity': 0, 'ivf_count': 0, 'ivf_generation': 0}
+        self.dim = header['dim']
+        self.count = header['count']
+        self.capacity = header['capacity']
+        self.ivf_count = header['ivf_count']
+        self.ivf_generation = header.get('ivf_generation', 0)
+
+        # A crash part-way through add() can leave vectors without metadata,
+        # metadata beyond the header count, or a half-written record; keep
+        # only what both files agree on
+        self.case_offsets, valid_end = self._load_case_offsets()
+        self.count = min(self.count, len(self.case_offsets))
+        if self.count < len(self.case_offsets):
+            valid_end = self.case_offsets[self.count]
+        del self.case_offsets[self.count:]
+        cases_path = self._path('cases.jsonl')
+        if os.path.exists(cases_path) and os.path.getsize(cases_path) > valid_end:
+            with open(cases_path, 'r+b') as f:
+                f.truncate(valid_end)
+
+        self.vectors = None
+        if self.capacity:
+            self.vectors = np.memmap(self._path('vectors.f16'), dtype=np.float16, mode='r+',
+                                     shape=(self.capacity, self.dim))
+        self._load_ivf()
+        self._publish()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_case_offsets(self):
+        """Byte offset of every complete record in cases.jsonl and the end of the last one
+
+        Records are read on demand so metadata for a million cases is not held in memory.
+        """
+        offsets = []
+        offset = 0
+        path = self._path('cases.jsonl')
+        if not os.path.exists(path):
+            return offsets, offset
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                offsets.append(offset)
+                offset += len(line)
+        return offsets, offset
+
+    def get_case(self, index):
+        """Read the metadata record of the vector at index"""
+        with open(self._path('cases.jsonl'), 'rb') as f:
+            f.seek(self.case_offsets[index])
+            return json.loads(f.readline())
+
+    def _write_header(self):
+        header = {
+            'dim': self.dim,
+            'count': self.count,
+            'capacity': self.capacity,
+            'ivf_count': self.ivf_count,
+            'ivf_generation': self.ivf_generation
+        }
+        tmp_path = self._path('header.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self._path('header.json'))
+
+    def _ivf_path(self, generation, name):
+        return self._path(f'ivf_{generation}_{name}')
+
+    def _publish(self):
+        """Make the current state visible to search() as one consistent snapshot"""
+        # (count, vectors, ivf, tail_lists) is replaced as a single tuple, so a
+        # search never pairs a count with a memmap or IVF index it does not cover
+        self.snapshot = (self.count, self.vectors, self.ivf, self.tail_lists)
+
+    def _load_ivf(self):
+        """Load the current IVF generation and the list assignments of vectors added since"""
+        self.ivf = None
+        self.tail_lists = None
+        if not self.ivf_count or not os.path.exists(self._ivf_path(self.ivf_generation, 'ids.npy')):
+            self.ivf_count = 0
+            return
+        generation = self.ivf_generation
+        centroids = np.load(self._ivf_path(generation, 'centroids.npy'))
+        self.ivf = (
+            centroids,
+            np.load(self._ivf_path(generation, 'offsets.npy')),
+            np.load(self._ivf_path(generation, 'ids.npy'), mmap_mode='r'),
+            self.ivf_count
+        )
+
+        # The tail file can be behind the vectors after a crash; assign the rest
+        tail_path = self._ivf_path(generation, 'tail.i32')
+        tail = np.fromfile(tail_path, dtype=np.int32) if os.path.exists(tail_path) else np.empty(0, np.int32)
+        n_tail = self.count - self.ivf_count
+        if len(tail) != n_tail:
+            tail = np.concatenate([tail[:n_tail], self._assign(centroids, self.ivf_count + len(tail), self.count)])
+            tail.tofile(tail_path)
+        self.tail_lists = np.empty(max(INITIAL_CAPACITY, n_tail), dtype=np.int32)
+        self.tail_lists[:n_tail] = tail
+
+    def _assign(self, centroids, start, stop):
+        """Nearest IVF list of every stored vector in rows [start, stop)"""
+        assignment = np.empty(max(0, stop - start), dtype=np.int32)
+        for chunk_start in range(start, stop, SCAN_CHUNK_ROWS):
+            chunk = self.vectors[chunk_start:min(chunk_start + SCAN_CHUNK_ROWS, stop)].astype(np.float32)
+            assignment[chunk_start - start:chunk_start - start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignment
+
+    def _append_tail(self, start, stop):
+        """Assign rows [start, stop) to the current IVF lists, in memory and on disk"""
+        if self.ivf is None:
+            return
+        assignment = self._assign(self.ivf[0], start, stop)
+        offset = start - self.ivf_count
+        if offset + len(assignment) > len(self.tail_lists):
+            # Copy into a larger array; snapshots keep reading the old one
+            capacity = len(self.tail_lists)
+            while capacity < offset + len(assignment):
+                capacity *= 2
+            grown = np.empty(capacity, dtype=np.int32)
+            grown[:offset] = self.tail_lists[:offset]
+            self.tail_lists = grown
+        self.tail_lists[offset:offset + len(assignment)] = assignment
+        with open(self._ivf_path(self.ivf_generation, 'tail.i32'), 'ab') as f:
+            f.write(assignment.tobytes())
+
+    def _grow(self, needed):
+        """Double the memmap capacity until needed rows fit"""
+        capacity = max(self.capacity, INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+        if self.vectors is not None:
+            self.vectors.flush()
+        with open(self._path('vectors.f16'), 'ab') as f:
+            f.truncate(capacity * self.dim * 2)
+        # Searches holding the old (smaller) map keep using it until they finish
+        self.vectors = np.memmap(self._path('vectors.f16'), dtype=np.float16, mode='r+',
+                                 shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def add(self, vectors, cases):
+        """Append embeddings with their case metadata, returns the new case ids"""
+        vectors = normalize(np.atleast_2d(vectors))
+        if len(vectors) != len(cases):
+            raise ValueError("Number of vectors and cases must match")
+
+        with self.lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            self._grow(self.count + len(vectors))
+            self.vectors[self.count:self.count + len(vectors)] = vectors.astype(np.float16)
+            self.vectors.flush()
+
+            records = []
+            for case in cases:
+                record = {'case_id': uuid.uuid4().hex, 'indexed_at': time.time()}
+                record.update(case)
+                records.append(record)
+            with open(self._path('cases.jsonl'), 'ab') as f:
+                offset = f.tell()
+                for record in records:
+                    line = (json.dumps(record) + '\n').encode('utf-8')
+                    f.write(line)
+                    self.case_offsets.append(offset)
+                    offset += len(line)
+
+            self._append_tail(self.count, self.count + len(records))
+            self.count += len(records)
+            self._write_header()
+            self._publish()
+        return [record['case_id'] for record in records]
+
+    def needs_rebuild(self):
+        """True when enough vectors were added since the last build to justify retraining it"""
+        unindexed = self.count - self.ivf_count
+        return self.count >= MIN_IVF_VECTORS and unindexed > IVF_REBUILD_FRACTION * self.count
+
+    def build_ivf(self, n_lists=None):
+        """Train IVF centroids on a sample and assign every stored vector to a list"""
+        with self.build_lock:
+            self._build_ivf(n_lists)
+
+    def _build_ivf(self, n_lists=None):
+        count = self.count
+        if count == 0:
+            return
+        # ~2*sqrt(N) lists keeps each probed list small at a million vectors
+        n_lists = n_lists or int(min(4096, max(1, 2 * np.sqrt(count))))
+        n_lists = min(n_lists, count)
+
+        rng = np.random.default_rng(0)
+        n_samples = min(count, max(n_lists, min(KMEANS_MAX_SAMPLES, n_lists * KMEANS_SAMPLES_PER_LIST)))
+        sample_ids = np.sort(rng.choice(count, n_samples, replace=False))
+        samples = self.vectors[sample_ids].astype(np.float32)
+        centroids = spherical_kmeans(samples, n_lists)
+
+        assignment = self._assign(centroids, 0, count)
+        list_ids = np.argsort(assignment, kind='stable').astype(np.int64)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_offsets[1:])
+
+        # Write a new generation next to the one being searched
+        previous = self.ivf_generation
+        generation = previous + 1
+        np.save(self._ivf_path(generation, 'centroids.npy'), centroids)
+        np.save(self._ivf_path(generation, 'offsets.npy'), list_offsets)
+        np.save(self._ivf_path(generation, 'ids.npy'), list_ids)
+
+        with self.lock:
+            # Vectors added while training go to the tail of the new generation
+            self._assign(centroids, count, self.count).tofile(self._ivf_path(generation, 'tail.i32'))
+            self.ivf_generation = generation
+            self.ivf_count = count
+            self._write_header()
+            self._load_ivf()
+            self._publish()
+
+        # Unlinked files stay readable through the memory maps still using them
+        for name in ('centroids.npy', 'offsets.npy', 'ids.npy', 'tail.i32'):
+            try:
+                os.remove(self._ivf_path(previous, name))
+            except FileNotFoundError:
+                pass
+        print(f"Built IVF index: {count} vectors in {n_lists} lists")
+
+    def rebuild_in_background(self):
+        """Rebuild the IVF index on a background thread if it is stale"""
+        if not self.needs_rebuild():
+            return
+        # Concurrent /predict threads all call this; only one starts a build
+        if not self.build_lock.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self._build_ivf()
+            except Exception as e:
+                print(f"Error building IVF index: {e}")
+            finally:
+                self.build_lock.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _scan(self, vectors, query, start, stop, k):
+        """Exact top-k over vector rows [start, stop)"""
+        best_scores = np.empty(0, dtype=np.float32)
+        best_ids = np.empty(0, dtype=np.int64)
+        for chunk_start in range(start, stop, SCAN_CHUNK_ROWS):
+            chunk_stop = min(chunk_start + SCAN_CHUNK_ROWS, stop)
+            scores = vectors[chunk_start:chunk_stop].astype(np.float32) @ query
+            ids = np.arange(chunk_start, chunk_stop, dtype=np.int64)
+            best_scores, best_ids = top_k(np.concatenate([best_scores, scores]),
+                                          np.concatenate([best_ids, ids]), k)
+        return best_scores, best_ids
+
+    def _probe(self, vectors, ivf, tail_lists, count, query, k, nprobe):
+        """Approximate top-k over the vectors of the nprobe closest IVF lists"""
+        centroids, list_offsets, list_ids, ivf_count = ivf
+        nprobe = min(nprobe, len(centroids))
+        lists = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        candidates = [list_ids[list_offsets[i]:list_offsets[i + 1]] for i in lists]
+        # Vectors added since the build, assigned to their nearest list on add()
+        tail = tail_lists[:count - ivf_count]
+        candidates.append(ivf_count + np.flatnonzero(np.isin(tail, lists)).astype(np.int64))
+        candidates = np.concatenate(candidates)
+        if len(candidates) == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        # Sorted ids read the memmap sequentially
+        candidates = np.sort(candidates)
+        scores = vectors[candidates].astype(np.float32) @ query
+        return top_k(scores, candidates, k)
+
+    def search(self, query, k=5, exact=False, nprobe=DEFAULT_NPROBE):
+        """Return up to k (case, similarity) pairs most similar to query"""
+        count, vectors, ivf, tail_lists = self.snapshot
+        if count == 0:
+            return []
+        query = normalize(query).reshape(-1)
+        k = min(k, count)
+
+        if exact or ivf is None:
+            scores, ids = self._scan(vectors, query, 0, count, k)
+        else:
+            scores, ids = self._probe(vectors, ivf, tail_lists, count, query, k, nprobe)
+
+        return [(self.get_case(i), float(score)) for score, i in zip(scores, ids)]
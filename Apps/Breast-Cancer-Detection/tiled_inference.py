@@ -0,0 +1,144 @@
+"""Tiled high-resolution inference for the detection API.
+
+Instead of squashing the whole mammogram into 224x224, the image is kept at a
+moderate resolution and covered with 224x224 windows. Background tiles are
+dropped with a cheap intensity test, the remaining tiles go through the model
+in fixed-size chunks (so memory is bounded by the chunk, not the image), and
+the tile probabilities are pooled back into a single 8-class vector that the
+regular response builder can consume.
+"""
+import os
+
+import numpy as np
+
+TILE_SIZE = 224
+
+# Longest side of the image before tiling (1344 = 6 tiles)
+TILED_MAX_SIDE = int(os.environ.get('TILED_MAX_SIDE', 1344))
+
+# Number of tiles per model.predict call
+TILE_BATCH_SIZE = int(os.environ.get('TILE_BATCH_SIZE', 16))
+
+# A tile is background unless enough of it is brighter than the threshold
+TISSUE_INTENSITY_THRESHOLD = 20
+MIN_TISSUE_FRACTION = 0.2
+
+POOLING_METHODS = ('max', 'mean', 'attention')
+
+# Lower temperature focuses attention pooling on the most suspicious tiles
+ATTENTION_TEMPERATURE = 0.1
+
+# Indices of the malignant classes in the model output (see class_names)
+MALIGNANT_INDICES = [1, 3, 5, 7]
+
+
+def tile_grid(image_shape, tile_size=TILE_SIZE, stride=None):
+    """Return (rows, cols) of the tile grid covering an image, padding the edges"""
+    stride = stride or tile_size
+    height, width = image_shape[:2]
+    rows = max(1, int(np.ceil((height - tile_size) / stride)) + 1)
+    cols = max(1, int(np.ceil((width - tile_size) / stride)) + 1)
+    return rows, cols
+
+
+def pad_to_grid(image, rows, cols, tile_size=TILE_SIZE, stride=None):
+    """Zero-pad an image so the tile grid fits exactly"""
+    stride = stride or tile_size
+    height = (rows - 1) * stride + tile_size
+    width = (cols - 1) * stride + tile_size
+    pad_h = max(0, height - image.shape[0])
+    pad_w = max(0, width - image.shape[1])
+    if pad_h == 0 and pad_w == 0:
+        return image
+    return np.pad(image, ((0, pad_h), (0, pad_w), (0, 0)))
+
+
+def is_tissue(tile):
+    """Cheap foreground test on a subsampled grayscale view of the tile"""
+    gray = tile[::4, ::4].mean(axis=-1)
+    return np.mean(gray > TISSUE_INTENSITY_THRESHOLD) >= MIN_TISSUE_FRACTION
+
+
+def select_tiles(image, tile_size=TILE_SIZE, stride=None):
+    """Return the padded image, grid shape and (row, col) positions of tissue tiles"""
+    stride = stride or tile_size
+    rows, cols = tile_grid(image.shape, tile_size, stride)
+    image = pad_to_grid(image, rows, cols, tile_size, stride)
+    positions = []
+    for row in range(rows):
+        for col in range(cols):
+            y, x = row * stride, col * stride
+            if is_tissue(image[y:y + tile_size, x:x + tile_size]):
+                positions.append((row, col))
+    return image, (rows, cols), positions
+
+
+def predict_tiles(model, image, positions, tile_size=TILE_SIZE, stride=None, batch_size=None):
+    """Run the model over the given tiles in fixed-size chunks"""
+    stride = stride or tile_size
+    batch_size = batch_size or TILE_BATCH_SIZE
+    outputs = []
+    for start in range(0, len(positions), batch_size):
+        chunk = positions[start:start + batch_size]
+        batch = np.empty((len(chunk), tile_size, tile_size, image.shape[2]), dtype=np.float32)
+        for i, (row, col) in enumerate(chunk):
+            y, x = row * stride, col * stride
+            batch[i] = image[y:y + tile_size, x:x + tile_size]
+        batch /= 255.0
+        outputs.append(model.predict(batch, batch_size=len(chunk), verbose=0))
+    return np.concatenate(outputs, axis=0)
+
+
+def pool_predictions(tile_preds, method='attention'):
+    """Aggregate per-tile class probabilities into one probability vector"""
+    if method == 'mean':
+        pooled = tile_preds.mean(axis=0)
+    elif method == 'max':
+        pooled = tile_preds.max(axis=0)
+    elif method == 'attention':
+        # Weight tiles by how malignant they look (softmax over malignancy)
+        malignancy = tile_preds[:, MALIGNANT_INDICES].sum(axis=1)
+        logits = malignancy / ATTENTION_TEMPERATURE
+        weights = np.exp(logits - logits.max())
+        weights /= weights.sum()
+        pooled = weights @ tile_preds
+    else:
+        raise ValueError(f"Unknown pooling method '{method}', expected one of {POOLING_METHODS}")
+    return pooled / pooled.sum()
+
+
+def malignancy_map(tile_preds, grid, positions):
+    """Coarse rows x cols map of per-tile malignant probability (None for background)"""
+    rows, cols = grid
+    result = [[None] * cols for _ in range(rows)]
+    malignancy = tile_preds[:, MALIGNANT_INDICES].sum(axis=1)
+    for (row, col), score in zip(positions, malignancy):
+        result[row][col] = round(float(score), 4)
+    return result
+
+
+def predict_tiled(model, image, pooling='attention', tile_size=TILE_SIZE, stride=None, batch_size=None):
+    """Tile a preprocessed uint8 RGB array, score tissue tiles and pool the results
+
+    Returns (pooled_prediction, tiling_info), or (None, tiling_info) if no
+    tile contains tissue.
+    """
+    if pooling not in POOLING_METHODS:
+        raise ValueError(f"Unknown pooling method '{pooling}', expected one of {POOLING_METHODS}")
+
+    padded, grid, positions = select_tiles(image, tile_size, stride)
+    tiling_info = {
+        'pooling': pooling,
+        'tile_size': tile_size,
+        'image_size': [int(image.shape[1]), int(image.shape[0])],
+        'grid': list(grid),
+        'tiles_total': grid[0] * grid[1],
+        'tiles_scored': len(positions),
+        'malignancy_map': None
+    }
+    if not positions:
+        return None, tiling_info
+
+    tile_preds = predict_tiles(model, padded, positions, tile_size, stride, batch_size)
+    tiling_info['malignancy_map'] = malignancy_map(tile_preds, grid, positions)
+    return pool_predictions(tile_preds, pooling), tiling_info